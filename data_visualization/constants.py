@@ -1,8 +1,18 @@
+import struct
+
 __all__ = ["STOP_SIGNAL", "DEFAULT_HOST", "DEFAULT_PORT", "ErrorMessageMixin"]
 
 STOP_SIGNAL = "STOP"
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 1024
+# first element of the messages registering a schema (see Publisher.register_schema)
+SCHEMA_SIGNAL = "SCHEMA"
+
+# headers of the messages sent by the Publisher to the Subscriber (see README.md):
+# length of the pickle stream and number of out-of-band buffers that follow it
+FRAME_HEADER = struct.Struct(">II")
+# length of each out-of-band buffer
+BUFFER_HEADER = struct.Struct(">I")
 
 
 class ErrorMessageMixin:
@@ -15,6 +25,10 @@ class ErrorMessageMixin:
                 self._verbose = True
                 break
 
-    def _print_status_message(self, message: str):
+    def _print_status_message(self, message: str, *args):
+        # the message is only formatted with args in verbose mode, so that callers in
+        # hot paths don't build strings that are discarded
         if self._verbose:
+            if args:
+                message = message.format(*args)
             print("[{}] : {}".format(self.__class__.__name__, message))
@@ -1,6 +1,9 @@
 #  Copyright (c) 2022. Tudor Oancea, Mattéo Berthet, Philippe Servant, EPFL Racing Team Driverless
 import multiprocessing as mp
+import pickle
+import queue
 import warnings
+import weakref
 from enum import Enum
 from time import perf_counter
 from typing import Optional, Union
@@ -15,7 +18,7 @@ from matplotlib.figure import Figure
 from matplotlib.gridspec import GridSpec
 
 from .constants import ErrorMessageMixin, DEFAULT_HOST, DEFAULT_PORT, STOP_SIGNAL
-from .subscriber import launch_client
+from .subscriber import launch_client, MsgDecoder
 
 __all__ = [
     "Plot",
@@ -26,6 +29,13 @@ __all__ = [
     "CarDataType",
 ]
 
+# fraction of the span of the data added to the limits of a subplot when the data goes out of them in live dynamic mode
+_LIVE_LIMITS_MARGIN = 0.25
+# number of values preallocated for each regular curve in live dynamic mode (doubled each time it is full)
+_LIVE_INITIAL_CAPACITY = 1024
+# buffers allocated by _append_live_data (by id), the only ones it can write into
+_LIVE_BUFFERS = weakref.WeakValueDictionary()
+
 
 class PlotMode(Enum):
     """
@@ -153,6 +163,7 @@ class Plot(ErrorMessageMixin):
 
     # stuff for Live dynamic mode
     _live_dynamic_data_queue: Optional[mp.Queue]
+    _msg_decoder: Optional[MsgDecoder]
     _no_more_values: Optional[bool]
 
     # value to show the cars or not and to know what to show
@@ -238,9 +249,11 @@ class Plot(ErrorMessageMixin):
                 kwargs=kwargs,
             )
             socket_proc.start()
+            self._msg_decoder = MsgDecoder()
             self._no_more_values = False
         else:
             self._live_dynamic_data_queue = None
+            self._msg_decoder = None
             self._no_more_values = None
 
     def add_subplot(
@@ -378,6 +391,8 @@ class Plot(ErrorMessageMixin):
             else:
                 raise ValueError("Unknown plot style: ", curve_values["curve_style"])
             curves[curve_name]["plot_fun"] = plot_fun
+            # data currently drawn for the curve, used to skip unchanged curves
+            curves[curve_name]["drawn_data"] = None
 
             # check the specified data for the curve
             # check that it has the right type
@@ -455,6 +470,7 @@ class Plot(ErrorMessageMixin):
             "subplot_type": subplot_type,
             "ax": ax,
             "curves": curves,
+            "limits": None,
         }
 
         # update the _subplot_names list
@@ -590,9 +606,13 @@ class Plot(ErrorMessageMixin):
                 self._fig,
                 self._update_plot_live_dynamic,
                 frames=self._live_dynamic_generator,
-                interval=1,
+                # the timer of the GUI polls the received data at the given interval
+                # instead of firing continuously, so that it has time to process its
+                # other events between the frames
+                interval=self._interval,
                 repeat=False,
                 blit=True,
+                cache_frame_data=False,
             )
 
         if save_path is not None:
@@ -689,18 +709,12 @@ class Plot(ErrorMessageMixin):
                                 + " should be a numpy array of shape (2,) but is "
                                 + str(curve.shape)
                             )
-                            if no_data_yet:
-                                new_data[subplot_name][curve_name] = np.expand_dims(
-                                    curve, 0
-                                )
-                            else:
-                                new_data[subplot_name][curve_name] = np.append(
-                                    self._content[subplot_name]["curves"][curve_name][
-                                        "data"
-                                    ],
-                                    np.expand_dims(curve, 0),
-                                    axis=0,
-                                )
+                            new_data[subplot_name][curve_name] = _append_live_data(
+                                self._content[subplot_name]["curves"][curve_name][
+                                    "data"
+                                ],
+                                curve,
+                            )
                         elif (
                             self._content[subplot_name]["curves"][curve_name][
                                 "curve_type"
@@ -763,19 +777,12 @@ class Plot(ErrorMessageMixin):
                                     + str(type(curve))
                                 )
                             # append to data
-                            if no_data_yet:
+                            new_data[subplot_name][curve_name] = _append_live_data(
                                 self._content[subplot_name]["curves"][curve_name][
                                     "data"
-                                ] = np.array([curve])
-                            else:
-                                new_data[subplot_name][curve_name] = np.hstack(
-                                    (
-                                        self._content[subplot_name]["curves"][
-                                            curve_name
-                                        ]["data"],
-                                        curve,
-                                    )
-                                )
+                                ],
+                                curve,
+                            )
                         elif (
                             self._content[subplot_name]["curves"][curve_name][
                                 "curve_type"
@@ -798,19 +805,32 @@ class Plot(ErrorMessageMixin):
                                 + " should be a numpy array of shape (n,) but is "
                                 + str(curve.shape)
                             )
-                            if no_data_yet:
-                                new_data[subplot_name][curve_name] = np.expand_dims(
-                                    curve, 0
-                                )
-                            else:
-                                new_data[subplot_name][curve_name] = np.vstack(
-                                    (
+                            if not no_data_yet:
+                                assert (
+                                    curve.shape
+                                    == self._content[subplot_name]["curves"][
+                                        curve_name
+                                    ]["data"].shape[1:]
+                                ), (
+                                    "The data for the curve "
+                                    + curve_name
+                                    + " in the subplot "
+                                    + subplot_name
+                                    + " should be a numpy array of shape "
+                                    + str(
                                         self._content[subplot_name]["curves"][
                                             curve_name
-                                        ]["data"],
-                                        np.expand_dims(curve, 0),
+                                        ]["data"].shape[1:]
                                     )
+                                    + " but is "
+                                    + str(curve.shape)
                                 )
+                            new_data[subplot_name][curve_name] = _append_live_data(
+                                self._content[subplot_name]["curves"][curve_name][
+                                    "data"
+                                ],
+                                curve,
+                            )
                         else:
                             self._print_status_message(
                                 "You sent data for a curve that is not regular or prediction, ignoring"
@@ -835,8 +855,8 @@ class Plot(ErrorMessageMixin):
             # we don't update the plot because some data were not in
             # the right format (we drop the frame)
             self._print_status_message(
-                "Received data are not in the right format, ignoring. Error message: "
-                + str(e)
+                "Received data are not in the right format, ignoring. Error message: {}",
+                e,
             )
             return False
 
@@ -848,11 +868,24 @@ class Plot(ErrorMessageMixin):
         else:
             have_to_update = False
             last_received_image = None
-            while not self._live_dynamic_data_queue.empty():
-                # first fetch new data via socket
-                received_data = self._live_dynamic_data_queue.get(block=True)
+            while True:
+                # first fetch new data via socket. get_nowait checks if the queue is
+                # empty and reads the next message with a single poll of its pipe
+                try:
+                    msg = self._live_dynamic_data_queue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    received_data = self._msg_decoder.decode(msg)
+                except pickle.PickleError:
+                    received_data = None
+                    self._print_status_message(
+                        "pickle error (message size may be too short)"
+                    )
+
                 if received_data is None:
-                    # There have been an UnpicklingError, so we don't have new data and do not update the plot
+                    # There have been an UnpicklingError or the message only registered a
+                    # schema, so we don't have new data and do not update the plot
                     pass
                 else:
                     # define the function that will actually update the content of the plot, will be called with the
@@ -878,20 +911,23 @@ class Plot(ErrorMessageMixin):
                         except AssertionError:
                             pass
 
-                        # update the data for the image
-                        try:
-                            last_received_image = cv2.imdecode(received_data[1], 1)
-                        except Exception:
-                            self._print_status_message("Received invalid image")
-                            pass
+                        # update the data for the image. Only the last received image
+                        # is shown, so it is decoded once all the messages are read
+                        if len(received_data) > 1:
+                            last_received_image = received_data[1]
                     else:
                         # the data is not a string, a dict or a tuple, so we don't update the plot
                         pass
 
             if have_to_update:
-                print(self._length_curves)
                 self._update_plot_common(self._length_curves)
 
+            if last_received_image is not None:
+                try:
+                    last_received_image = cv2.imdecode(last_received_image, 1)
+                except Exception:
+                    last_received_image = None
+                    self._print_status_message("Received invalid image")
             if last_received_image is not None:
                 cv2.imshow("image", last_received_image)
                 cv2.waitKey(1)
@@ -907,30 +943,26 @@ class Plot(ErrorMessageMixin):
         """
         if self.mode == PlotMode.LIVE_DYNAMIC and self._length_curves == 0:
             return
+        limits_changed = False
         for subplot_name, subplot in self._content.items():
             for curve_name, curve in subplot["curves"].items():
                 if subplot["subplot_type"] == SubplotType.TEMPORAL:
                     if curve["curve_type"] != CurveType.STATIC:
-                        if curve["curve_type"] == CurveType.REGULAR:
-                            xdata = np.arange(curves_size, dtype=np.float32)
-                        else:
-                            xdata = (
-                                np.arange(curve["data"].shape[1], dtype=np.float32)
-                                + curves_size
-                                - 1
-                            )
-                        if self._sampling_time is not None:
-                            xdata *= self._sampling_time
                         if curve["curve_style"] != CurvePlotStyle.SCATTER:
                             curve["line"].set_data(
-                                xdata,
-                                curve["data"][:curves_size]
-                                if curve["curve_type"] == CurveType.REGULAR
-                                else curve["data"]
-                                if curve["curve_type"] == CurveType.STATIC
-                                else curve["data"][curves_size - 1],
+                                *self._curve_xy(subplot, curve, curves_size)
                             )
                         else:
+                            if curve["curve_type"] == CurveType.REGULAR:
+                                xdata = np.arange(curves_size, dtype=np.float32)
+                            else:
+                                xdata = (
+                                    np.arange(curve["data"].shape[1], dtype=np.float32)
+                                    + curves_size
+                                    - 1
+                                )
+                            if self._sampling_time is not None:
+                                xdata *= self._sampling_time
                             curve["line"].set_offsets(
                                 np.array(
                                     [
@@ -947,11 +979,10 @@ class Plot(ErrorMessageMixin):
                         if curve["curve_type"] == CurveType.REGULAR:
                             if curve["curve_style"] != CurvePlotStyle.SCATTER:
                                 self._print_status_message(
-                                    "plot " + str(curve["data"][:curves_size, 0])
+                                    "plot {}", curve["data"][:curves_size, 0]
                                 )
                                 curve["line"].set_data(
-                                    curve["data"][:curves_size, 0],
-                                    curve["data"][:curves_size, 1],
+                                    *self._curve_xy(subplot, curve, curves_size)
                                 )
                             else:
                                 self._print_status_message("scatter")
@@ -959,14 +990,16 @@ class Plot(ErrorMessageMixin):
                                     curve["data"][:curves_size, :],
                                 )
                         elif curve["curve_type"] == CurveType.PREDICTION:
+                            if (
+                                self.mode == PlotMode.LIVE_DYNAMIC
+                                and curve["data"] is curve["drawn_data"]
+                            ):
+                                # the prediction did not change since the last frame
+                                continue
+                            curve["drawn_data"] = curve["data"]
                             if curve["curve_style"] != CurvePlotStyle.SCATTER:
                                 curve["line"].set_data(
-                                    curve["data"][curves_size - 1, :, 0]
-                                    if self.mode == PlotMode.DYNAMIC
-                                    else curve["data"][:, 0],
-                                    curve["data"][curves_size - 1, :, 1]
-                                    if self.mode == PlotMode.DYNAMIC
-                                    else curve["data"][:, 1],
+                                    *self._curve_xy(subplot, curve, curves_size)
                                 )
                             else:
                                 curve["line"].set_offsets(
@@ -980,8 +1013,15 @@ class Plot(ErrorMessageMixin):
                 else:
                     raise ValueError("Unknown subplot type: ", subplot["subplot_type"])
 
-            subplot["ax"].relim()
-            subplot["ax"].autoscale_view()
+            if self.mode == PlotMode.LIVE_DYNAMIC:
+                limits = _grow_live_limits(subplot)
+            else:
+                subplot["ax"].relim()
+                subplot["ax"].autoscale_view()
+                limits = (subplot["ax"].get_xlim(), subplot["ax"].get_ylim())
+            if limits != subplot["limits"]:
+                subplot["limits"] = limits
+                limits_changed = True
 
         if self._show_cars:
             for car in self._cars:
@@ -1159,7 +1199,129 @@ class Plot(ErrorMessageMixin):
                     self._content[car._trajectory[0]]["ax"].add_patch(wheel_bl)
                     self._content[car._trajectory[0]]["ax"].add_patch(wheel_br)
 
-        self._fig.canvas.draw()
+        # The animation only redraws the curves on top of the background of the axes
+        # cached for blitting, so the whole figure has to be redrawn if the background
+        # changed, i.e. if the axes limits (and thus the ticks) changed or if the cars
+        # (which are not blitted) moved.
+        if limits_changed or self._show_cars:
+            self._fig.canvas.draw()
+
+    def _curve_xy(self, subplot: dict, curve: dict, curves_size: int) -> tuple:
+        """
+        Computes the data to draw for a regular or prediction curve that is not a scatter plot.
+
+        :param subplot: the subplot containing the curve
+        :param curve: the curve
+        :param curves_size: the common size of all the regular curves
+        :returns: the x and y data of the curve
+        """
+        data = curve["data"]
+        if subplot["subplot_type"] == SubplotType.TEMPORAL:
+            if curve["curve_type"] == CurveType.REGULAR:
+                xdata = np.arange(curves_size, dtype=np.float32)
+                ydata = data[:curves_size]
+            else:
+                xdata = np.arange(data.shape[1], dtype=np.float32) + curves_size - 1
+                ydata = data[curves_size - 1]
+            if self._sampling_time is not None:
+                xdata *= self._sampling_time
+            return xdata, ydata
+
+        if curve["curve_type"] == CurveType.REGULAR:
+            return data[:curves_size, 0], data[:curves_size, 1]
+        if self.mode == PlotMode.DYNAMIC:
+            # in live dynamic mode only the last prediction is stored
+            data = data[curves_size - 1]
+        return data[:, 0], data[:, 1]
+
+
+def _append_live_data(data: Optional[np.ndarray], value) -> np.ndarray:
+    """
+    Appends a value to the data of a curve in live dynamic mode. The data is a view on the beginning of a bigger array
+    whose size doubles when it is full, so that appending is done in amortized constant time instead of copying all
+    the data at each message. The value is written after the end of the view, so the data of the curve does not change
+    until it is replaced by the returned view.
+    Data that is not such a view (e.g. the initial data of the curve) is copied into a new buffer, and the buffer is
+    reallocated with a wider dtype if the value does not fit in it, like np.append would do.
+
+    :param data: the current data of the curve (None if it did not receive any data yet)
+    :param value: the value to append, a float or an array with the shape of the other values
+    :returns: a view on the data with the value appended
+    """
+    value = np.asarray(value)
+    if data is None:
+        data = np.empty((0,) + value.shape, dtype=value.dtype)
+    buffer = data.base
+    size = data.shape[0]
+    dtype = np.promote_types(data.dtype, value.dtype)
+    if (
+        buffer is None
+        or _LIVE_BUFFERS.get(id(buffer)) is not buffer
+        or size == buffer.shape[0]
+        or dtype != buffer.dtype
+    ):
+        buffer = np.empty(
+            (max(2 * size, _LIVE_INITIAL_CAPACITY),) + data.shape[1:], dtype=dtype
+        )
+        _LIVE_BUFFERS[id(buffer)] = buffer
+        buffer[:size] = data
+    buffer[size] = value
+    return buffer[: size + 1]
+
+
+def _grow_live_limits(subplot: dict) -> Optional[tuple]:
+    """
+    Computes the limits of a subplot in live dynamic mode. Contrary to autoscale_view, the limits only change when
+    the data goes out of them, and they are then extended with a margin proportional to their span. Since every
+    change of the limits needs a full redraw of the canvas instead of a blit, this way the curves that keep growing
+    only trigger a logarithmic number of full redraws.
+
+    :param subplot: the subplot whose limits to compute
+    :returns: the x and y limits of the subplot, or None if it does not contain any data yet
+    """
+    ax = subplot["ax"]
+    ax.relim()
+    # dataLim is [[x_min, y_min], [x_max, y_max]]
+    data_limits = ax.dataLim.get_points()
+    if not np.isfinite(data_limits).all():
+        return subplot["limits"]
+
+    limits = []
+    for axis, (low, high) in enumerate(data_limits.T):
+        # on a logarithmic axis only the positive data is shown, and the margin is applied to the logarithms
+        log = (ax.get_xscale(), ax.get_yscale())[axis] == "log"
+        if log:
+            min_positive = ax.dataLim.minpos[axis]
+            if not np.isfinite(min_positive):
+                return subplot["limits"]
+            low = np.log10(max(low, min_positive))
+            high = np.log10(max(high, min_positive))
+        if subplot["limits"] is None:
+            view_low, view_high = np.inf, -np.inf
+        else:
+            view_low, view_high = subplot["limits"][axis]
+            if log:
+                view_low, view_high = np.log10(view_low), np.log10(view_high)
+            if view_low <= low and high <= view_high:
+                limits.append(subplot["limits"][axis])
+                continue
+        margin = _LIVE_LIMITS_MARGIN * (max(high, view_high) - min(low, view_low))
+        if margin <= 0.0:
+            margin = 1.0
+        axis_limits = (
+            low - margin if low < view_low else view_low,
+            high + margin if high > view_high else view_high,
+        )
+        if log:
+            axis_limits = (10.0 ** axis_limits[0], 10.0 ** axis_limits[1])
+        limits.append(axis_limits)
+    limits = tuple(limits)
+    if limits != subplot["limits"]:
+        # auto=None leaves autoscaling on, otherwise the spatial subplots with an equal aspect ratio warn that they
+        # have to ignore fixed limits to keep it
+        ax.set_xlim(limits[0], auto=None)
+        ax.set_ylim(limits[1], auto=None)
+    return limits
 
 
 def _convert_to_contiguous_slice(idx: Union[slice, int, range]) -> slice:
@@ -1,19 +1,44 @@
 #  Copyright (c) 2022. Tudor Oancea, Mattéo Berthet, EPFL Racing Team Driverless
+import asyncio
+import atexit
+import os
 import pickle
-import struct
-from queue import Queue
+import signal
+from collections import deque
 from socket import socket, AF_INET, SOCK_STREAM
-from threading import Thread
-from time import sleep
-from typing import Union
+from threading import Thread, current_thread, main_thread
+from typing import NamedTuple, Optional, Union
 
 import cv2
+import numpy as np
 
 from .constants import *
-from .constants import ErrorMessageMixin
+from .constants import ErrorMessageMixin, FRAME_HEADER, BUFFER_HEADER, SCHEMA_SIGNAL
 
 __all__ = ["Publisher"]
 
+# sentinel put in the message queue by Publisher.terminate() to stop the event loop
+_STOP = object()
+# period in seconds of the status messages while waiting for a Subscriber
+_CONNECTION_LOG_PERIOD = 15.0
+# time in seconds given by Publisher.terminate() to the auxiliary thread to send the
+# queued messages, after which the ones that the Subscriber did not read are dropped
+_TERMINATE_TIMEOUT = 5.0
+
+
+class _SchemaRegistration(NamedTuple):
+    # queued by Publisher.register_schema, sent as a plain tuple
+    signal: str
+    token: int
+    shell: dict
+    placeholders: list
+
+
+class _SchemaValues(NamedTuple):
+    # queued by Publisher.publish_msg for a message following a registered schema
+    token: int
+    values: list
+
 
 class Publisher(ErrorMessageMixin):
     """
@@ -21,7 +46,8 @@ class Publisher(ErrorMessageMixin):
     -----------
 
     Class used to send data to a Subscriber class that is to be plotted in live dynamic mode.
-    It uses a socket connection that is dealt with in an auxiliary thread.
+    It uses a socket connection that is dealt with by an asyncio event loop running in an
+    auxiliary thread.
 
     Usage:
     ------
@@ -29,97 +55,418 @@ class Publisher(ErrorMessageMixin):
     >>> publisher = Publisher(host, port)
     >>> publisher.publish_msg("hello")
     >>> publisher.publish_msg({"subplot_1": {"curve_1": np.random.rand(10)}})
+    >>> token = publisher.register_schema({"subplot_1": {"curve_1": np.zeros(10)}})
+    >>> publisher.publish_msg(token, [np.random.rand(10)])
     """
 
     host: str  # Hostname of the machine on which runs the Subscriber.
     port: int  # port to which to connect
-    stop: bool  # used to stop the auxiliary thread when the main thread is killed
-    _msg_queue: Queue  # queue used to send data to publish to the auxiliary thread
-    msg_history: list  # list of all the messages sent
+    _msg_queue: deque  # queue used to send data to publish to the auxiliary thread
+    _msg_event: Optional[asyncio.Event]  # set to wake up the loop (made by the loop)
+    _wakeup_pending: bool  # whether _msg_event will be set, to wake up the loop once
+    msg_history: deque  # last messages sent (only kept in verbose mode, for debugging)
     _publisher_socket: socket  # socket used to connect to the Subscriber
-    _publisher_thread: Thread  # thread used to send data to the Subscriber
+    _publisher_thread: Thread  # thread running _loop
+    _loop: asyncio.AbstractEventLoop  # event loop used to send data to the Subscriber
+    _serve_task: asyncio.Task  # task of _serve run by _loop
+    _connection: asyncio.Future  # resolved with the StreamWriter of the Subscriber
+    _terminated: bool  # whether terminate() has already been called
+    _previous_sigint_handler: object  # SIGINT handler replaced by _sigint, or None
+    _pid: int  # process that created the Publisher (forked children inherit _sigint)
     verbose: bool  # if True, print the status messages
+    jpeg_quality: int  # JPEG quality (0-100) used to encode the published images
+    _jpeg_params: list  # parameters passed to cv2.imencode
+    _encoders: dict  # functions encoding the published messages, indexed by their type
+    float64_curves: set  # (subplot name, curve name) of the curves sent in float64
+    _msgs_sent: int  # number of messages sent to the Subscriber
+    _bytes_sent: int  # number of bytes sent to the Subscriber
+    _schemas: list  # (placeholders, buffer, views) of the registered schemas, by token
 
-    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, **kwargs):
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+        jpeg_quality: int = 75,
+        float64_curves: Optional[list] = None,
+        **kwargs,
+    ):
+        """
+        :param host: hostname of the machine on which runs the Subscriber
+        :param port: port to which to connect
+        :param jpeg_quality: JPEG quality (0-100) used to encode the published images
+        :param float64_curves: list of (subplot name, curve name) tuples of the curves
+            whose float64 arrays should not be downcast to float32 (see publish_msg)
+        :param kwargs: additional arguments to pass to the ErrorMessageMixin constructor
+        """
         super().__init__(**kwargs)
         self.host = host
         self.port = port
-        self.stop = False
-        self._msg_queue = Queue()
-        self.msg_history = []
+        self.jpeg_quality = jpeg_quality
+        self._jpeg_params = [
+            int(cv2.IMWRITE_JPEG_QUALITY),
+            jpeg_quality,
+            int(cv2.IMWRITE_JPEG_OPTIMIZE),
+            1,
+        ]
+        self.float64_curves = set(float64_curves) if float64_curves else set()
+        self._encoders = {
+            dict: self._encode_dict_msg,
+            tuple: self._encode_image_msg,
+            _SchemaValues: self._encode_schema_values,
+            _SchemaRegistration: tuple,
+        }
+        self._schemas = []
+        self._msg_queue = deque()
+        # created in the event loop, since it is bound to the loop that creates it
+        # before Python 3.10
+        self._msg_event = None
+        self._wakeup_pending = False
+        self.msg_history = deque(maxlen=1024)
+        self._msgs_sent = 0
+        self._bytes_sent = 0
 
-        # connect the socket
+        # bind the socket here so that errors are raised in the caller's thread
         self._publisher_socket = socket(AF_INET, SOCK_STREAM)
         self._publisher_socket.bind((host, port))
         self._publisher_socket.listen(5)
 
-        # start the auxiliary thread
+        # start the event loop in the auxiliary thread. It is a daemon thread so that
+        # the interpreter does not wait for it before calling terminate() at exit
+        self._loop = asyncio.new_event_loop()
+        self._connection = self._loop.create_future()
+        self._serve_task = self._loop.create_task(self._serve())
         self._publisher_thread = Thread(
-            target=self._publisher_thread_target, args=(self._publisher_socket,)
+            target=self._loop.run_until_complete, args=(self._serve_task,), daemon=True
         )
         self._publisher_thread.start()
 
-    def publish_msg(self, msg: Union[str, dict, tuple]):
+        # safely end the communication at exit or on Ctrl+C (signal handlers can only
+        # be set in the main thread)
+        self._terminated = False
+        self._pid = os.getpid()
+        atexit.register(self.terminate)
+        if current_thread() is main_thread():
+            self._previous_sigint_handler = signal.signal(signal.SIGINT, self._sigint)
+        else:
+            self._previous_sigint_handler = None
+
+    @property
+    def msgs_sent(self) -> int:
+        """Number of messages sent to the Subscriber so far (including STOP_SIGNAL)."""
+        return self._msgs_sent
+
+    @property
+    def bytes_sent(self) -> int:
+        """Number of bytes sent to the Subscriber so far, framing included."""
+        return self._bytes_sent
+
+    def register_schema(self, template: dict) -> int:
+        """
+        Register the structure of the dictionary messages that will be published
+        repeatedly, so that only their values are sent afterwards, without the subplot
+        and curve names and the dtypes and shapes of the arrays.
+
+        :param template: a dictionary message whose values give the dtype and shape of
+            the values of the following messages (None values are kept as is)
+        :returns: the token to pass to publish_msg with the values of the messages
+        """
+        shell = {}
+        placeholders = []
+        size = 0
+        for subplot_name, subplot in template.items():
+            shell[subplot_name] = {}
+            for curve_name, curve in subplot.items():
+                if curve is None:
+                    shell[subplot_name][curve_name] = None
+                    continue
+                curve = np.asarray(curve)
+                if (subplot_name, curve_name) not in self.float64_curves:
+                    curve = _to_float32(curve)
+                # the values are packed in a single buffer, aligned on 8 bytes
+                size += -size % 8
+                placeholders.append(
+                    (subplot_name, curve_name, curve.dtype.str, curve.shape, size)
+                )
+                size += curve.nbytes
+
+        # the values of each message are copied in this buffer through the views
+        buffer = bytearray(size)
+        views = [
+            np.ndarray(shape, dtype=dtype, buffer=buffer, offset=offset)
+            for _, _, dtype, shape, offset in placeholders
+        ]
+        token = len(self._schemas)
+        self._schemas.append((placeholders, buffer, views))
+        self._put(_SchemaRegistration(SCHEMA_SIGNAL, token, shell, placeholders))
+        return token
+
+    def publish_msg(self, msg: Union[str, dict, tuple, int], values: list = None):
         """
         Publish a message to the Subscriber (embedded in a Plot) via the socket to which
          it is connected.
 
-        :param msg: message to be sent, either a string that should only be STOP_SIGNAL
-        or a dictionary containing the data to be plotted
+        :param msg: message to be sent, either a string that should only be STOP_SIGNAL,
+        a dictionary containing the data to be plotted or a tuple (dictionary, image).
+        The float64 arrays are sent in float32 (which is more than enough for plotting)
+        to halve the amount of data sent, unless their curve is listed in float64_curves.
+        It can also be a token returned by register_schema, in which case the message
+        is made of the given values.
+        Whatever its type, the message is encoded and sent later by the auxiliary thread
+        without being copied, so neither it nor the arrays, image and values it contains
+        should be modified after being published (only the float64 arrays sent in
+        float32 are copied when converted).
+        :param values: only with a token, the values of the curves of the message in the
+        order of the schema template, each with the shape of the template value
         """
-        if type(msg) == tuple:
-            new_msg = (msg[0], cv2.imencode(".jpeg", msg[1], [60, 90])[1])
-        else:
-            new_msg = msg
-
-        self.msg_history.append(new_msg)
-        self._msg_queue.put(new_msg)
-        self._print_status_message(
-            "added message to publish queue, new size: {}".format(
-                self._msg_queue.qsize()
+        if values is not None:
+            if type(msg) is not int or not 0 <= msg < len(self._schemas):
+                raise ValueError("Unknown schema token: {}".format(msg))
+            placeholders = self._schemas[msg][0]
+            if len(values) != len(placeholders):
+                raise ValueError(
+                    "Expected {} values for schema {} but got {}".format(
+                        len(placeholders), msg, len(values)
+                    )
+                )
+            for (subplot_name, curve_name, _, shape, _), value in zip(
+                placeholders, values
+            ):
+                if np.shape(value) != shape:
+                    raise ValueError(
+                        "The value for the curve {} in the subplot {} should have "
+                        "shape {} but has shape {}".format(
+                            curve_name, subplot_name, shape, np.shape(value)
+                        )
+                    )
+            msg = _SchemaValues(msg, values)
+        if self._verbose:
+            self.msg_history.append(msg)
+        self._put(msg)
+        if self._verbose:
+            self._print_status_message(
+                "added message to publish queue, new size: {}",
+                len(self._msg_queue),
             )
-        )
+
+    def _put(self, msg):
+        # Called in the caller's thread. Appending to a deque is atomic so the message
+        # is put directly in the queue, and the event loop is only woken up (which
+        # costs a system call) if it has not already been since it emptied the queue.
+        if self._terminated:
+            self._print_status_message("Already terminated, message dropped")
+            return
+        self._msg_queue.append(msg)
+        if not self._wakeup_pending:
+            self._wakeup_pending = True
+            self._loop.call_soon_threadsafe(self._wake_up)
+
+    def _wake_up(self):
+        # called in the event loop. Before _serve creates the event, the queue is
+        # checked anyway when it starts.
+        if self._msg_event is not None:
+            self._msg_event.set()
 
     def terminate(self):
+        """
+        Send STOP_SIGNAL to the Subscriber after the messages already published and
+        close the connection. If they are not all sent within _TERMINATE_TIMEOUT seconds
+        (e.g. because the Subscriber stopped reading), the remaining ones are dropped and
+        the connection is aborted. It is called automatically at exit and on SIGINT,
+        and does nothing if it was already called.
+        """
+        if self._terminated:
+            return
+        self._terminated = True
+        atexit.unregister(self.terminate)
+        if (
+            self._previous_sigint_handler is not None
+            and current_thread() is main_thread()
+            and signal.getsignal(signal.SIGINT) == self._sigint
+        ):
+            signal.signal(signal.SIGINT, self._previous_sigint_handler)
         self._print_status_message("Terminating...")
-        self.stop = True
-        # self._print_status_message(self.msg_history)
-        self._publisher_thread.join()
+        self._loop.call_soon_threadsafe(self._request_stop)
+        self._publisher_thread.join(_TERMINATE_TIMEOUT)
+        if self._publisher_thread.is_alive():
+            self._print_status_message(
+                "Messages not sent after {} s, dropping them", _TERMINATE_TIMEOUT
+            )
+            self._loop.call_soon_threadsafe(self._serve_task.cancel)
+            self._publisher_thread.join()
         self._print_status_message("Server thread is joined")
+        self._loop.close()
         self._publisher_socket.close()
         self._print_status_message("Socket is closed")
         self._print_status_message("off")
 
+    def _sigint(self, signum, frame):
+        # terminate the connection, then handle SIGINT as before the Publisher existed
+        if os.getpid() == self._pid:
+            self.terminate()
+        if callable(self._previous_sigint_handler):
+            self._previous_sigint_handler(signum, frame)
+        elif self._previous_sigint_handler != signal.SIG_IGN:
+            raise KeyboardInterrupt
+
+    def _request_stop(self):
+        # called in the event loop: stop waiting for a Subscriber if none is connected
+        # yet, otherwise send STOP_SIGNAL after the messages already published
+        self._connection.cancel()
+        self._msg_queue.append(_STOP)
+        self._wake_up()
+
+    def _encode_dict_msg(self, msg: dict) -> dict:
+        # Downcast the float64 arrays of the curves, without modifying the published
+        # dict. An array published for several curves is converted only once, so that
+        # they still share it and pickle sends it once and then references it.
+        converted = {}
+        new_msg = {}
+        for subplot_name, subplot in msg.items():
+            if not isinstance(subplot, dict):
+                # not a valid message, it will be rejected by the Plot
+                new_msg[subplot_name] = subplot
+                continue
+            new_msg[subplot_name] = {}
+            for curve_name, curve in subplot.items():
+                if (subplot_name, curve_name) not in self.float64_curves:
+                    if id(curve) not in converted:
+                        converted[id(curve)] = _to_float32(curve)
+                    curve = converted[id(curve)]
+                new_msg[subplot_name][curve_name] = curve
+        return new_msg
+
+    def _encode_image_msg(self, msg: tuple) -> tuple:
+        # JPEG-encode the image of a (dictionary, image) message
+        return (
+            self._encode_dict_msg(msg[0]),
+            cv2.imencode(".jpeg", msg[1], self._jpeg_params)[1],
+        )
+
+    def _encode_schema_values(self, msg: _SchemaValues) -> tuple:
+        # The values are packed in the preallocated buffer of the schema, sent as a
+        # single raw out-of-band buffer since the Subscriber already knows the dtype,
+        # shape and offset of each value. The buffer is copied once packed because the
+        # transport may keep a reference to it until it is actually sent.
+        _, buffer, views = self._schemas[msg.token]
+        for view, value in zip(views, msg.values):
+            view[...] = value
+        return msg.token, pickle.PickleBuffer(bytes(buffer))
+
     @staticmethod
-    def send_msg(client, msg):
-        # Prefix each message with a 4-byte length (network byte order)
-        msg = struct.pack(">I", len(msg)) + msg
-        client.sendall(msg)
+    def _frame_msg(item, parts: list) -> int:
+        # Pickle with protocol 5 so that the numpy arrays are not copied in the pickle
+        # stream but sent afterwards as raw out-of-band buffers, each prefixed with its
+        # 4-byte length (network byte order). The parts of the frame are appended to
+        # parts, to be given to the writer with those of the other queued frames.
+        # Returns the number of bytes of the frame.
+        buffers = []
+        data = pickle.dumps(item, protocol=5, buffer_callback=buffers.append)
+        parts.append(FRAME_HEADER.pack(len(data), len(buffers)))
+        parts.append(data)
+        size = FRAME_HEADER.size + len(data)
+        for buffer in buffers:
+            raw = buffer.raw()
+            parts.append(BUFFER_HEADER.pack(raw.nbytes))
+            parts.append(raw)
+            size += BUFFER_HEADER.size + raw.nbytes
+        return size
 
-    def _publisher_thread_target(self, s):
+    def _count_sent(self, size: int):
+        self._msgs_sent += 1
+        self._bytes_sent += size
+        # amortize the logging over many messages
+        if self._verbose and self._msgs_sent % 100 == 0:
+            self._print_status_message(
+                "sent {} messages ({} bytes)", self._msgs_sent, self._bytes_sent
+            )
+
+    async def _serve(self):
+        # set at first so that the loop below checks the messages queued meanwhile and
+        # resets _wakeup_pending
+        self._msg_event = asyncio.Event()
+        self._msg_event.set()
         self._print_status_message("Server is ready ...")
 
-        s.settimeout(15)
-        client, adr = s.accept()
+        # only the first Subscriber that connects is served
+        def on_connection(reader, writer):
+            if self._connection.done():
+                writer.close()
+            else:
+                self._connection.set_result(writer)
+
+        server = await asyncio.start_server(on_connection, sock=self._publisher_socket)
+        try:
+            # wait until a Subscriber connects or terminate() is called, the messages
+            # published meanwhile are queued
+            while True:
+                try:
+                    writer = await asyncio.wait_for(
+                        asyncio.shield(self._connection), _CONNECTION_LOG_PERIOD
+                    )
+                    break
+                except asyncio.TimeoutError:
+                    self._print_status_message(
+                        "No Subscriber connected yet, {} messages queued",
+                        len(self._msg_queue),
+                    )
+        except asyncio.CancelledError:
+            self._print_status_message("Terminated before a Subscriber connected")
+            return
+        finally:
+            server.close()
 
         self._print_status_message("Connection established")
-        while True:
-            if self.stop:
-                self.send_msg(client, pickle.dumps(STOP_SIGNAL))
-                self._print_status_message("Switching off...")
-                break
-
-            if self._msg_queue.empty():
-                sleep(0.1)
-            else:
-                item = self._msg_queue.get_nowait()
-                data = pickle.dumps(item)
-                self.send_msg(client, data)
-                self._print_status_message("sent")
-                self._print_status_message(str(len(data)))
+        try:
+            await self._send_queued_msgs(writer)
+            writer.close()
+            await writer.wait_closed()
+        except asyncio.CancelledError:
+            # cancelled by terminate() when the Subscriber does not read the messages
+            writer.transport.abort()
+            self._print_status_message("Connection aborted")
+            return
+        self._print_status_message("Connection closed")
+
+    async def _send_queued_msgs(self, writer: asyncio.StreamWriter):
+        # sends the published messages until STOP_SIGNAL
+        stop = False
+        while not stop:
+            if not self._msg_queue:
+                await self._msg_event.wait()
+                self._msg_event.clear()
+                # reset before emptying the queue, so that a message put meanwhile is
+                # either sent below or wakes up the loop again
+                self._wakeup_pending = False
+                continue
+            item = self._msg_queue.popleft()
+            # frame all the messages that are already queued and give them to the
+            # writer with a single call before waiting for the socket
+            parts = []
+            while True:
+                if item is _STOP:
+                    self._count_sent(self._frame_msg(STOP_SIGNAL, parts))
+                    self._print_status_message("Switching off...")
+                    stop = True
+                    break
+
+                # encode the message here to keep it off the caller's thread
+                encoder = self._encoders.get(type(item))
+                if encoder is not None:
+                    item = encoder(item)
+                self._count_sent(self._frame_msg(item, parts))
                 if item == STOP_SIGNAL:
-                    print("Switching off...")
+                    self._print_status_message("Switching off...")
+                    stop = True
+                    break
+                if not self._msg_queue:
                     break
+                item = self._msg_queue.popleft()
+            writer.writelines(parts)
+            await writer.drain()
 
-        client.close()
-        self._print_status_message("Connection closed")
+
+def _to_float32(data):
+    # returns float64 numpy arrays as float32, and any other data unchanged
+    if type(data) is np.ndarray and data.dtype == np.float64:
+        return data.astype(np.float32)
+    return data
@@ -1,13 +1,19 @@
 #  Copyright (c) 2022. Tudor Oancea, Mattéo Berthet EPFL Racing Team Driverless
 import pickle
-import struct
 from multiprocessing import Queue
+from io import BufferedReader
 from socket import socket, AF_INET, SOCK_STREAM
 
+import numpy as np
+
 from .constants import *
-from .constants import ErrorMessageMixin
+from .constants import ErrorMessageMixin, FRAME_HEADER, BUFFER_HEADER, SCHEMA_SIGNAL
+
+__all__ = ["Subscriber", "launch_client", "decode_msg", "MsgDecoder"]
 
-__all__ = ["Subscriber", "launch_client"]
+# pickle stream sent by the Publisher for STOP_SIGNAL, used to detect it without
+# unpickling every message
+_STOP_SIGNAL_STREAM = pickle.dumps(STOP_SIGNAL, protocol=5)
 
 
 class Subscriber(ErrorMessageMixin):
@@ -16,6 +22,9 @@ class Subscriber(ErrorMessageMixin):
     msg_size: int
     _msg_queue: Queue
     _subscriber_socket: socket
+    _reader: BufferedReader  # buffered reader on the socket
+    _recv_buf: bytearray  # reusable receive buffer, grown if a message exceeds it
+    _header_buf: bytearray  # receive buffer for the frame and buffer headers
 
     def __init__(
         self,
@@ -30,7 +39,11 @@ class Subscriber(ErrorMessageMixin):
         self.port = port
         self._msg_queue = q
         self.msg_size = msg_size
+        self._recv_buf = bytearray(msg_size)
+        self._header_buf = bytearray(FRAME_HEADER.size)
+        self._connect()
 
+    def _connect(self):
         # connect to the socket
         connected = False
         self._print_status_message("connecting ...")
@@ -42,48 +55,132 @@ class Subscriber(ErrorMessageMixin):
             except OSError:
                 # Do nothing, just try again
                 pass
+        # read the socket through a buffer, so that the small headers and messages
+        # that arrive together are read with a single system call
+        self._reader = self._subscriber_socket.makefile("rb")
 
         self._print_status_message("connected !")
 
     def recv_msg(self):
-        # Read message length and unpack it into an integer
-        raw_msglen = self.recvall(4)
-        if not raw_msglen:
+        # Read the frame header and unpack the length of the pickle stream and the
+        # number of out-of-band buffers that follow it
+        header = memoryview(self._header_buf)
+        if not self._recv_into(header):
+            return None
+        msglen, buffer_nbr = FRAME_HEADER.unpack(header)
+        # Read the pickle stream
+        data = self.recvall(msglen)
+        if data is None:
             return None
-        msglen = struct.unpack(">I", raw_msglen)[0]
-        # Read the message data
-        return self.recvall(msglen)
+        # Read the out-of-band buffers. Each one gets its own bytearray since the
+        # unpickled numpy arrays directly use it as memory.
+        buffers = []
+        for _ in range(buffer_nbr):
+            if not self._recv_into(header[: BUFFER_HEADER.size]):
+                return None
+            buffer = bytearray(BUFFER_HEADER.unpack_from(header)[0])
+            if not self._recv_into(memoryview(buffer)):
+                return None
+            buffers.append(buffer)
+        return data, buffers
 
     def recvall(self, n):
-        # Helper function to recv n bytes or return None if EOF is hit
-        data = bytearray()
-        while len(data) < n:
-            packet = self._subscriber_socket.recv(n - len(data))
-            if not packet:
-                return None
-            data.extend(packet)
-        return data
+        # Helper function to recv n bytes or return None if EOF is hit.
+        # The bytes are written in place in the preallocated receive buffer and a
+        # memoryview on it is returned, so it is only valid until the next call.
+        if n > len(self._recv_buf):
+            # allocate a new buffer instead of resizing since views may still exist
+            self._recv_buf = bytearray(max(n, 2 * len(self._recv_buf)))
+        view = memoryview(self._recv_buf)[:n]
+        return view if self._recv_into(view) else None
+
+    def _recv_into(self, view: memoryview) -> bool:
+        # Helper function to fill the given view, returns False if EOF is hit
+        received = 0
+        while received < len(view):
+            nbytes = self._reader.readinto(view[received:])
+            if not nbytes:
+                return False
+            received += nbytes
+        return True
+
+    def _close(self):
+        self._reader.close()
+        self._subscriber_socket.close()
 
     def run(self):
+        # The messages are not unpickled here but forwarded as raw frames to the Plot
+        # (see decode_msg), since the multiprocessing queue would pickle them again.
         while True:
             stream = self.recv_msg()
-            try:
-                data = pickle.loads(stream)
-            except pickle.PickleError:
-                data = None
-                self._print_status_message(
-                    "pickle error (message size may be too short)"
-                )
+            if stream is None:
+                self._print_status_message("Connection closed by the publisher")
+                self._msg_queue.put(STOP_SIGNAL)
+                self._close()
+                break
 
-            if data == STOP_SIGNAL:
+            if stream[0] == _STOP_SIGNAL_STREAM and not stream[1]:
                 self._print_status_message("Switching off...")
                 self._msg_queue.put(STOP_SIGNAL)
-                self._subscriber_socket.close()
+                self._close()
                 break
-            self._msg_queue.put(data)
+            # the pickle stream is copied since the receive buffer is reused
+            self._msg_queue.put((bytes(stream[0]), stream[1]))
             self._print_status_message("received message and added it to queue")
 
 
+def decode_msg(msg):
+    """
+    Decodes a message put in the queue by the Subscriber, i.e. either STOP_SIGNAL or a
+    raw frame (pickle stream, out-of-band buffers) that is unpickled here.
+
+    :raises pickle.PickleError: if the pickle stream is invalid
+    """
+    if type(msg) is str:
+        return msg
+    return pickle.loads(msg[0], buffers=msg[1])
+
+
+class MsgDecoder:
+    """
+    Decodes the messages put in the queue by the Subscriber like decode_msg, and also
+    rebuilds the messages published with a schema (see Publisher.register_schema).
+    """
+
+    _schemas: dict  # (shell, placeholders) of the registered schemas, by token
+
+    def __init__(self):
+        self._schemas = {}
+
+    def decode(self, msg):
+        """
+        :returns: the decoded message, or None if it only registered a schema
+        :raises pickle.PickleError: if the message is invalid or its schema is unknown
+        """
+        msg = decode_msg(msg)
+        if type(msg) is not tuple or not msg:
+            return msg
+        if msg[0] == SCHEMA_SIGNAL:
+            _, token, shell, placeholders = msg
+            self._schemas[token] = (shell, placeholders)
+            return None
+        if type(msg[0]) is int:
+            try:
+                shell, placeholders = self._schemas[msg[0]]
+            except KeyError:
+                raise pickle.UnpicklingError("Unknown schema {}".format(msg[0]))
+            new_msg = {
+                subplot_name: dict(subplot) for subplot_name, subplot in shell.items()
+            }
+            # the values are views on the single buffer of the message
+            for subplot_name, curve_name, dtype, shape, offset in placeholders:
+                new_msg[subplot_name][curve_name] = np.ndarray(
+                    shape, dtype=dtype, buffer=msg[1], offset=offset
+                )
+            return new_msg
+        return msg
+
+
 def launch_client(
     q: Queue,
     host: str = DEFAULT_HOST,
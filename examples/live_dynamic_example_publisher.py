@@ -1,64 +1,85 @@
 #  Copyright (c) 2022. Tudor Oancea, EPFL Racing Team Driverless
-import signal
-from time import perf_counter
+from time import perf_counter, sleep
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from data_visualization import Publisher, STOP_SIGNAL
 
+rng = np.random.default_rng(127)
+
 
 def sleep_precise(sec):
-    start = perf_counter()
-    while perf_counter() - start < sec:
+    # sleep for most of the time and only busy-wait the last 2 ms for precision,
+    # to leave the CPU to the plotting process
+    end = perf_counter() + sec
+    if sec > 2e-3:
+        sleep(sec - 2e-3)
+    while perf_counter() < end:
         pass
 
 
-def signal_handler(publisher):
-    print("You pressed Ctrl+C!")
-    publisher.terminate()
-    exit(0)
-
-
 def main():
+    # the Publisher terminates its connection by itself at exit and on Ctrl+C
     publisher = Publisher(verbose=False)
-    # connect SIGINT signal to the signal handler to safely terminate the Publisher's connection
-    signal.signal(signal.SIGINT, lambda s, b: signal_handler(publisher))
 
     N = 100  # number of time steps
     M = 10  # number of prediction steps
 
     # create data for the map subplot
     x = np.linspace(0, 6 * np.pi, N + M)
-    y = 5 * np.sin(x / 3) + np.random.randn(N + M) * 0.1
-    traj_pred = np.zeros((N, M, 2))
-    for i in range(N):
-        traj_pred[i, :, 0] = x[i : i + M]
-        traj_pred[i, :, 1] = y[i : i + M]
+    y = 5 * np.sin(x / 3) + rng.standard_normal(N + M) * 0.1
+    traj_pred = np.stack(
+        [sliding_window_view(x, M)[:N], sliding_window_view(y, M)[:N]], axis=-1
+    )
     traj = np.array([x[:N], y[:N]]).T
 
-    # create data for the speed and steering angle subplots
-    y = np.sin(np.arange(N + M) / 10) + np.random.randn(N + M) * 0.1
-    orientation_steering_pred = np.zeros((N, M))
-    for i in range(N):
-        orientation_steering_pred[i, :] = y[i : i + M]
-    orientation_steering = y[:N]
+    # create data for the orientation and steering angle subplots
+    y = np.sin(np.arange(N + M) / 10) + rng.standard_normal(N + M) * 0.1
+    orientation_pred = sliding_window_view(y, M)[:N].copy()
+    orientation = y[:N]
+    # the steering angle subplot shows the same data, in distinct arrays
+    steering_pred = orientation_pred.copy()
+    steering = orientation.copy()
+
+    # the data is sent in float32, so convert it once and for all
+    traj = traj.astype(np.float32)
+    traj_pred = traj_pred.astype(np.float32)
+    orientation = orientation.astype(np.float32)
+    orientation_pred = orientation_pred.astype(np.float32)
+    steering = steering.astype(np.float32)
+    steering_pred = steering_pred.astype(np.float32)
+
+    # register the structure of the messages once, only their values are sent afterwards
+    token = publisher.register_schema(
+        {
+            "map": {
+                "trajectory": traj[0],
+                "trajectory_pred": traj_pred[0],
+            },
+            "orientation": {
+                "orientation": orientation[0],
+                "orientation_pred": orientation_pred[0],
+            },
+            "steering": {
+                "steering": steering[0],
+                "steering_pred": steering_pred[0],
+            },
+        }
+    )
 
     for i in range(N):
+        # the values are given in the order of the schema
         publisher.publish_msg(
-            {
-                "map": {
-                    "trajectory": traj[i],
-                    "trajectory_pred": traj_pred[i],
-                },
-                "orientation": {
-                    "orientation": orientation_steering[i],
-                    "orientation_pred": orientation_steering_pred[i],
-                },
-                "steering": {
-                    "steering": orientation_steering[i],
-                    "steering_pred": orientation_steering_pred[i],
-                },
-            }
+            token,
+            [
+                traj[i],
+                traj_pred[i],
+                orientation[i],
+                orientation_pred[i],
+                steering[i],
+                steering_pred[i],
+            ],
         )
         sleep_precise(0.1)
 
@@ -3,7 +3,7 @@ import numpy as np
 
 from data_visualization import *
 
-np.random.seed(127)
+rng = np.random.default_rng(127)
 
 
 def main():
@@ -25,7 +25,7 @@ def main():
         show_unit=True,
         curves={
             "cones": {
-                "data": np.random.rand(10, 2) * np.pi,
+                "data": rng.random((10, 2)) * np.pi,
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.SCATTER,
                 "mpl_options": {"color": "red", "marker": "^"},
@@ -1,9 +1,10 @@
 #  Copyright (c) 2022. Tudor Oancea, EPFL Racing Team Driverless
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 from data_visualization import *
 
-np.random.seed(127)
+rng = np.random.default_rng(127)
 
 
 def main():
@@ -20,11 +21,10 @@ def main():
 
     # create data for the map subplot
     x = np.linspace(0, 6 * np.pi, N + M)
-    y = 5 * np.sin(x / 3) + np.random.randn(N + M) * 0.1
-    predictions = np.zeros((N, M, 2))
-    for i in range(N):
-        predictions[i, :, 0] = x[i : i + M]
-        predictions[i, :, 1] = y[i : i + M]
+    y = 5 * np.sin(x / 3) + rng.standard_normal(N + M) * 0.1
+    predictions = np.stack(
+        [sliding_window_view(x, M)[:N], sliding_window_view(y, M)[:N]], axis=-1
+    )
     trajectory = np.array([x[:N], y[:N]]).T
 
     plot.add_subplot(
@@ -36,7 +36,7 @@ def main():
         show_unit=True,
         curves={
             "cones": {
-                "data": np.random.rand(10, 2) * np.pi,
+                "data": rng.random((10, 2)) * np.pi,
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.SCATTER,
                 "mpl_options": {"color": "red", "marker": "^"},
@@ -56,10 +56,8 @@ def main():
         },
     )
     # create data for the speed and steering angle subplots
-    y = np.sin(np.arange(N + M) / 10) + np.random.randn(N + M) * 0.1
-    predictions = np.zeros((N, M))
-    for i in range(N):
-        predictions[i, :] = y[i : i + M]
+    y = np.sin(np.arange(N + M) / 10) + rng.standard_normal(N + M) * 0.1
+    predictions = sliding_window_view(y, M)[:N].copy()
     trajectory = y[:N]
 
     plot.add_subplot(
@@ -1,43 +1,43 @@
-import signal
-from time import perf_counter
+from time import perf_counter, sleep
 
 import numpy as np
 
 from data_visualization import Publisher, STOP_SIGNAL
 from fsds_client import Simulation
 
+rng = np.random.default_rng(127)
+
 
 def sleep_precise(sec):
-    start = perf_counter()
-    while perf_counter() - start < sec:
+    # sleep for most of the time and only busy-wait the last 2 ms for precision,
+    # to leave the CPU to the plotting process
+    end = perf_counter() + sec
+    if sec > 2e-3:
+        sleep(sec - 2e-3)
+    while perf_counter() < end:
         pass
 
 
-def signal_handler(publisher):
-    print("You pressed Ctrl+C!")
-    publisher.terminate()
-    exit(0)
-
-
 def main(with_sim: bool = False):
     publisher = Publisher(verbose=False)
-
-    def bruh(s, b):
-        signal_handler(publisher)
-
-    signal.signal(signal.SIGINT, bruh)
     if with_sim:
         sim = Simulation(ip="10.211.55.3")
         pass
     for i in range(300):
+        # draw all the values of the message at once, directly in float32 since they
+        # are sent in float32 anyway, and send views of the buffer, a new one for each
+        # message since they are only encoded later by the Publisher thread
+        buf = rng.random(1 + 3 + 2 + 2 * 5, dtype=np.float32)
+        buf[:4] *= 0.06
+        buf[:4] -= 0.03
         di = {
             "temporal": {
-                "yaw": np.random.rand() * 0.06 - 0.03,
-                "yaw_pred": np.random.rand(3) * 0.06 - 0.03,
+                "yaw": buf[0],
+                "yaw_pred": buf[1:4],
             },
             "spatial": {
-                "traj": np.random.rand(2),
-                "traj_pred": np.random.rand(2, 5),
+                "traj": buf[4:6],
+                "traj_pred": buf[6:].reshape(2, 5),
             },
         }
         if with_sim:
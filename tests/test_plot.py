@@ -1,253 +1,187 @@
 #  Copyright (c) 2022. Tudor Oancea, Philippe Servant, EPFL Racing Team Driverless
 import os
 
+# The tests only check that the plots are built without errors, so they are not
+# shown and use the non-interactive Agg backend (unless another one is explicitly
+# requested). Set DV_TEST_SHOW=1 to see them, and DV_TEST_SAVE=1 to also encode the
+# videos of the tests that save them (which needs FFmpeg).
+SHOW = bool(int(os.environ.get("DV_TEST_SHOW", "0")))
+SAVE = bool(int(os.environ.get("DV_TEST_SAVE", "0")))
+if not SHOW:
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
 import numpy as np
 import pytest
-
-from data_visualization import *
+from matplotlib import pyplot as plt
+from numpy.lib.stride_tricks import sliding_window_view
+
+from data_visualization import CurvePlotStyle, CurveType, Plot, PlotMode, SubplotType
+from data_visualization.plot import _append_live_data, _grow_live_limits
+
+# base signals of the tests, computed once (the plots do not modify their data) in
+# float32, which is enough for plotting
+_SIN_2PI_100 = np.sin(np.linspace(0, 2 * np.pi, 100, dtype=np.float32))
+_LOG_0_2_100 = np.logspace(0, 2, 100, dtype=np.float32)
+_LIN_10PI_100 = np.linspace(0, 10 * np.pi, 100, dtype=np.float32)
+_SIN_10PI_100 = np.sin(_LIN_10PI_100)
+_COS_10PI_100 = np.cos(_LIN_10PI_100)
+_LIN_10PI_1000 = np.linspace(0, 10 * np.pi, 1000, dtype=np.float32)
+_SIN_10PI_1000 = np.sin(_LIN_10PI_1000)
+_COS_10PI_1000 = np.cos(_LIN_10PI_1000)
+# shared between the tests, so any accidental modification should raise
+for _signal in (
+    _SIN_2PI_100,
+    _LOG_0_2_100,
+    _LIN_10PI_100,
+    _SIN_10PI_100,
+    _COS_10PI_100,
+    _LIN_10PI_1000,
+    _SIN_10PI_1000,
+    _COS_10PI_1000,
+):
+    _signal.setflags(write=False)
+
+
+@pytest.fixture(autouse=True)
+def _close_figures():
+    # pyplot keeps every figure (and its canvas) alive until it is closed
+    yield
+    plt.close("all")
+
+
+@pytest.fixture
+def rng() -> np.random.Generator:
+    # a new generator for each test, so that its data does not depend on the other tests
+    # that ran before it (e.g. with -k or pytest-xdist)
+    return np.random.default_rng(0)
+
+
+@pytest.fixture(scope="session")
+def static_pts() -> np.ndarray:
+    # random points shared by the tests (the plots do not modify their data)
+    pts = np.random.default_rng(127).random((20, 2), dtype=np.float32) * 10.0
+    pts.setflags(write=False)
+    return pts
+
+
+@pytest.fixture(scope="module")
+def digit127_path() -> np.ndarray:
+    # path writing 127, in float32 since matplotlib converts the integers to floats
+    path = np.array(
+        [
+            [1, 2],
+            [1, 3],
+            [1, 4],
+            [1, 5],
+            [1, 6],
+            [3, 6],
+            [4, 6],
+            [5, 6],
+            [5, 5],
+            [5, 4],
+            [4, 4],
+            [3, 4],
+            [3, 3],
+            [3, 2],
+            [4, 2],
+            [5, 2],
+            [7, 6],
+            [8, 6],
+            [9, 6],
+            [9, 5],
+            [9, 4],
+            [8, 3],
+            [7, 2],
+        ],
+        dtype=np.float32,
+    )
+    path.setflags(write=False)
+    return path
+
+
+def _empty_curves() -> dict:
+    # the name and position of a subplot are checked before its curves, so the tests
+    # of these checks use a single curve without data (a new dict each time since
+    # add_subplot modifies it)
+    return {
+        "x": {
+            "data": np.empty((0, 2), dtype=np.float32),
+            "curve_type": CurveType.STATIC,
+            "curve_style": CurvePlotStyle.PLOT,
+        },
+    }
 
 
 def test_same_name():
-    with pytest.raises(ValueError, match="A subplot with the same name already exists"):
-        plot = Plot(
-            mode=PlotMode.STATIC,
-            sampling_time=0.1,
-            interval=50,
-            row_nbr=1,
-            col_nbr=1,
-        )
-        plot.add_subplot(
-            subplot_name="test spatial plot step: ",
-            subplot_type=SubplotType.SPATIAL,
-            row_idx=0,
-            col_idx=0,
-            unit="unit",
-            show_unit=True,
-            curves={
-                "x": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.STATIC,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "red", "marker": "^"},
-                },
-                "y": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.REGULAR,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "blue"},
-                },
-            },
-        )
-        plot.add_subplot(
-            subplot_name="test spatial plot step: ",
-            subplot_type=SubplotType.SPATIAL,
-            row_idx=0,
-            col_idx=0,
-            unit="unit",
-            show_unit=True,
-            curves={
-                "x": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.STATIC,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "red", "marker": "^"},
-                },
-                "y": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.REGULAR,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "blue"},
-                },
-            },
-        )
-    plot.plot(show=False)
-
-
-def test_superpose():
-    with pytest.raises(ValueError, match="The subplot superposes with other subplots"):
-        plot = Plot(
-            mode=PlotMode.STATIC,
-            sampling_time=0.1,
-            interval=50,
-            row_nbr=1,
-            col_nbr=1,
-        )
-        plot.add_subplot(
-            subplot_name="test spatial plot step: ",
-            subplot_type=SubplotType.SPATIAL,
-            row_idx=0,
-            col_idx=0,
-            unit="unit",
-            show_unit=True,
-            curves={
-                "x": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.STATIC,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "red", "marker": "^"},
-                },
-                "y": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.REGULAR,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "blue"},
-                },
-            },
-        )
-        plot.add_subplot(
-            subplot_name="test spatial plot step: 2",
-            subplot_type=SubplotType.SPATIAL,
-            row_idx=0,
-            col_idx=0,
-            unit="unit",
-            show_unit=True,
-            curves={
-                "x": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.STATIC,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "red", "marker": "^"},
-                },
-                "y": {
-                    "data": (np.random.rand(20, 2) * 10.0),
-                    "curve_type": CurveType.REGULAR,
-                    "curve_style": CurvePlotStyle.STEP,
-                    "mpl_options": {"color": "blue"},
-                },
-            },
-        )
-    plot.plot(show=False)
-
-
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_spatial_plot_scatter(mode: PlotMode, mode_name: str):
     plot = Plot(
-        mode=mode,
+        mode=PlotMode.STATIC,
         sampling_time=0.1,
         interval=50,
         row_nbr=1,
         col_nbr=1,
     )
     plot.add_subplot(
-        subplot_name="test spatial plot scatter: " + mode_name,
+        subplot_name="test spatial plot step: ",
         subplot_type=SubplotType.SPATIAL,
         row_idx=0,
         col_idx=0,
         unit="unit",
         show_unit=True,
-        curves={
-            "x": {
-                "data": (np.random.rand(20, 2) * 10.0),
-                "curve_type": CurveType.STATIC,
-                "curve_style": CurvePlotStyle.SCATTER,
-                "mpl_options": {"color": "red", "marker": "^"},
-            },
-            # [NOTE] Dynamic scatter is not implemented yet
-            "y": {
-                "data": np.array(
-                    [
-                        [1, 2],
-                        [1, 3],
-                        [1, 4],
-                        [1, 5],
-                        [1, 6],
-                        [3, 6],
-                        [4, 6],
-                        [5, 6],
-                        [5, 5],
-                        [5, 4],
-                        [4, 4],
-                        [3, 4],
-                        [3, 3],
-                        [3, 2],
-                        [4, 2],
-                        [5, 2],
-                        [7, 6],
-                        [8, 6],
-                        [9, 6],
-                        [9, 5],
-                        [9, 4],
-                        [8, 3],
-                        [7, 2],
-                    ]
-                ),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.PLOT,
-                "mpl_options": {"color": "blue", "marker": "o"},
-            },
-        },
+        curves=_empty_curves(),
     )
-    plot.plot(show=True)
+    with pytest.raises(ValueError, match="A subplot with the same name already exists"):
+        plot.add_subplot(
+            subplot_name="test spatial plot step: ",
+            subplot_type=SubplotType.SPATIAL,
+            row_idx=0,
+            col_idx=0,
+            unit="unit",
+            show_unit=True,
+            curves=_empty_curves(),
+        )
+    plot.plot(show=False)
 
 
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_spatial_plot_plot(mode: PlotMode, mode_name: str):
+def test_superpose():
     plot = Plot(
-        mode=mode,
+        mode=PlotMode.STATIC,
         sampling_time=0.1,
         interval=50,
         row_nbr=1,
         col_nbr=1,
     )
     plot.add_subplot(
-        subplot_name="test spatial plot plot: " + mode_name,
+        subplot_name="test spatial plot step: ",
         subplot_type=SubplotType.SPATIAL,
         row_idx=0,
         col_idx=0,
         unit="unit",
         show_unit=True,
-        curves={
-            "x": {
-                "data": (np.random.rand(20, 2) * 10.0),
-                "curve_type": CurveType.STATIC,
-                "curve_style": CurvePlotStyle.PLOT,
-                "mpl_options": {"color": "red", "marker": "^"},
-            },
-            "y": {
-                "data": np.array(
-                    [
-                        [1, 2],
-                        [1, 3],
-                        [1, 4],
-                        [1, 5],
-                        [1, 6],
-                        [3, 6],
-                        [4, 6],
-                        [5, 6],
-                        [5, 5],
-                        [5, 4],
-                        [4, 4],
-                        [3, 4],
-                        [3, 3],
-                        [3, 2],
-                        [4, 2],
-                        [5, 2],
-                        [7, 6],
-                        [8, 6],
-                        [9, 6],
-                        [9, 5],
-                        [9, 4],
-                        [8, 3],
-                        [7, 2],
-                    ]
-                ),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.PLOT,
-                "mpl_options": {"color": "blue"},
-            },
-        },
+        curves=_empty_curves(),
     )
-    plot.plot(show=True)
+    with pytest.raises(ValueError, match="The subplot superposes with other subplots"):
+        plot.add_subplot(
+            subplot_name="test spatial plot step: 2",
+            subplot_type=SubplotType.SPATIAL,
+            row_idx=0,
+            col_idx=0,
+            unit="unit",
+            show_unit=True,
+            curves=_empty_curves(),
+        )
+    plot.plot(show=False)
 
 
+@pytest.mark.parametrize("mode", [PlotMode.STATIC, PlotMode.DYNAMIC])
 @pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
+    "curve_style", [CurvePlotStyle.SCATTER, CurvePlotStyle.PLOT, CurvePlotStyle.STEP]
 )
-def test_spatial_plot_step(mode: PlotMode, mode_name: str):
+def test_spatial_plot(
+    mode: PlotMode,
+    curve_style: CurvePlotStyle,
+    static_pts: np.ndarray,
+    digit127_path: np.ndarray,
+):
     plot = Plot(
         mode=mode,
         sampling_time=0.1,
@@ -255,8 +189,20 @@ def test_spatial_plot_step(mode: PlotMode, mode_name: str):
         row_nbr=1,
         col_nbr=1,
     )
+    if curve_style == CurvePlotStyle.STEP:
+        regular_data = static_pts
+        regular_options = {"color": "blue"}
+    else:
+        regular_data = digit127_path
+        regular_options = (
+            {"color": "blue", "marker": "o"}
+            if curve_style == CurvePlotStyle.SCATTER
+            else {"color": "blue"}
+        )
     plot.add_subplot(
-        subplot_name="test spatial plot step: " + mode_name,
+        subplot_name="test spatial plot {}: {}".format(
+            curve_style.name.lower(), mode.name
+        ),
         subplot_type=SubplotType.SPATIAL,
         row_idx=0,
         col_idx=0,
@@ -264,183 +210,67 @@ def test_spatial_plot_step(mode: PlotMode, mode_name: str):
         show_unit=True,
         curves={
             "x": {
-                "data": (np.random.rand(20, 2) * 10.0),
+                "data": static_pts,
                 "curve_type": CurveType.STATIC,
-                "curve_style": CurvePlotStyle.STEP,
+                "curve_style": curve_style,
                 "mpl_options": {"color": "red", "marker": "^"},
             },
+            # [NOTE] Dynamic scatter is not implemented yet
             "y": {
-                "data": (np.random.rand(20, 2) * 10.0),
+                "data": regular_data,
                 "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.STEP,
-                "mpl_options": {"color": "blue"},
-            },
-        },
-    )
-    plot.plot(show=True)
-
-
-@pytest.mark.parametrize("mode,mode_name", [(PlotMode.STATIC, "STATIC")])
-def test_temporal_plot_scatter(mode: PlotMode, mode_name: str):
-    plot = Plot(
-        mode=mode,
-        sampling_time=0.1,
-        interval=10,
-        row_nbr=1,
-        col_nbr=1,
-    )
-    plot.add_subplot(
-        subplot_name="test temporal plot scatter: " + mode_name,
-        subplot_type=SubplotType.TEMPORAL,
-        row_idx=0,
-        col_idx=0,
-        unit="unit",
-        show_unit=True,
-        curves={
-            "yaw": {
-                "data": np.sin(np.linspace(0, 2 * np.pi, 100)),
-                "curve_type": CurveType.STATIC,
-                "curve_style": CurvePlotStyle.SCATTER,
-                "options": {"color": "blue", "marker": "o"},
-            },
-        },
-    )
-    plot.plot(show=True)
-
-
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_temporal_plot_plot(mode: PlotMode, mode_name: str):
-    plot = Plot(
-        mode=mode,
-        sampling_time=0.1,
-        interval=10,
-        row_nbr=1,
-        col_nbr=1,
-    )
-    plot.add_subplot(
-        subplot_name="test temporal plot plot: " + mode_name,
-        subplot_type=SubplotType.TEMPORAL,
-        row_idx=0,
-        col_idx=0,
-        unit="unit",
-        show_unit=True,
-        curves={
-            "yaw": {
-                "data": np.sin(np.linspace(0, 2 * np.pi, 100)),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.PLOT,
-                "options": {"color": "blue", "marker": "o"},
-            },
-        },
-    )
-    plot.plot(show=True)
-
-
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_temporal_plot_step(mode: PlotMode, mode_name: str):
-    plot = Plot(
-        mode=mode,
-        sampling_time=0.1,
-        interval=10,
-        row_nbr=1,
-        col_nbr=1,
-    )
-    plot.add_subplot(
-        subplot_name="test temporal plot step: " + mode_name,
-        subplot_type=SubplotType.TEMPORAL,
-        row_idx=0,
-        col_idx=0,
-        unit="unit",
-        show_unit=True,
-        curves={
-            "yaw": {
-                "data": np.sin(np.linspace(0, 2 * np.pi, 100)),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.STEP,
-                "options": {"color": "blue", "marker": "o"},
-            },
-        },
-    )
-    plot.plot(show=True)
-
-
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_temporal_plot_semilogx(mode: PlotMode, mode_name: str):
-    plot = Plot(
-        mode=mode,
-        sampling_time=1.0,
-        interval=1,
-        row_nbr=1,
-        col_nbr=1,
-    )
-    plot.add_subplot(
-        subplot_name="test temporal plot semilogx: " + mode_name,
-        subplot_type=SubplotType.TEMPORAL,
-        row_idx=0,
-        col_idx=0,
-        unit="unit",
-        show_unit=True,
-        curves={
-            "yaw": {
-                "data": np.logspace(0, 2, 100),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.SEMILOGX,
-                "options": {"color": "blue", "marker": "o"},
-            },
-        },
-    )
-    plot.plot(show=True)
-
-
-@pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
-)
-def test_temporal_plot_semilogy(mode: PlotMode, mode_name: str):
-    plot = Plot(
-        mode=mode,
-        sampling_time=1.0,
-        interval=1,
-        row_nbr=1,
-        col_nbr=1,
-    )
-    plot.add_subplot(
-        subplot_name="test temporal plot semilogy: " + mode_name,
-        subplot_type=SubplotType.TEMPORAL,
-        row_idx=0,
-        col_idx=0,
-        unit="unit",
-        show_unit=True,
-        curves={
-            "yaw": {
-                "data": np.logspace(0, 2, 100),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.SEMILOGY,
-                "options": {"color": "blue", "marker": "o"},
+                "curve_style": (
+                    CurvePlotStyle.PLOT
+                    if curve_style == CurvePlotStyle.SCATTER
+                    else curve_style
+                ),
+                "mpl_options": regular_options,
             },
         },
     )
-    plot.plot(show=True)
+    plot.plot(show=SHOW)
 
 
 @pytest.mark.parametrize(
-    "mode,mode_name", [(PlotMode.STATIC, "STATIC"), (PlotMode.DYNAMIC, "DYNAMIC")]
+    "mode,curve_style",
+    # [NOTE] Dynamic scatter is not implemented yet
+    [(PlotMode.STATIC, CurvePlotStyle.SCATTER)]
+    + [
+        (mode, curve_style)
+        for curve_style in (
+            CurvePlotStyle.PLOT,
+            CurvePlotStyle.STEP,
+            CurvePlotStyle.SEMILOGX,
+            CurvePlotStyle.SEMILOGY,
+            CurvePlotStyle.LOGLOG,
+        )
+        for mode in (PlotMode.STATIC, PlotMode.DYNAMIC)
+    ],
 )
-def test_temporal_plot_loglog(mode: PlotMode, mode_name: str):
+def test_temporal_plot(mode: PlotMode, curve_style: CurvePlotStyle):
+    if curve_style in (
+        CurvePlotStyle.SEMILOGX,
+        CurvePlotStyle.SEMILOGY,
+        CurvePlotStyle.LOGLOG,
+    ):
+        data = _LOG_0_2_100
+        sampling_time = 1.0
+        interval = 1
+    else:
+        data = _SIN_2PI_100
+        sampling_time = 0.1
+        interval = 10
     plot = Plot(
         mode=mode,
-        sampling_time=1.0,
-        interval=1,
+        sampling_time=sampling_time,
+        interval=interval,
         row_nbr=1,
         col_nbr=1,
     )
     plot.add_subplot(
-        subplot_name="test temporal plot loglog: " + mode_name,
+        subplot_name="test temporal plot {}: {}".format(
+            curve_style.name.lower(), mode.name
+        ),
         subplot_type=SubplotType.TEMPORAL,
         row_idx=0,
         col_idx=0,
@@ -448,14 +278,18 @@ def test_temporal_plot_loglog(mode: PlotMode, mode_name: str):
         show_unit=True,
         curves={
             "yaw": {
-                "data": np.logspace(0, 2, 100),
-                "curve_type": CurveType.REGULAR,
-                "curve_style": CurvePlotStyle.LOGLOG,
+                "data": data,
+                "curve_type": (
+                    CurveType.STATIC
+                    if curve_style == CurvePlotStyle.SCATTER
+                    else CurveType.REGULAR
+                ),
+                "curve_style": curve_style,
                 "options": {"color": "blue", "marker": "o"},
             },
         },
     )
-    plot.plot(show=True)
+    plot.plot(show=SHOW)
 
 
 def test_temporal_prediction():
@@ -475,13 +309,13 @@ def test_temporal_prediction():
         show_unit=True,
         curves={
             "yaw": {
-                "data": np.sin(np.linspace(0, 10 * np.pi, 1000).reshape(100, 10)),
+                "data": _SIN_10PI_1000.reshape(100, 10),
                 "curve_type": CurveType.PREDICTION,
                 "curve_style": CurvePlotStyle.PLOT,
                 "options": {"color": "blue", "marker": "o"},
             },
             "yaw2": {
-                "data": np.cos(np.linspace(0, 10 * np.pi, 1000)),
+                "data": _COS_10PI_1000,
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.PLOT,
                 "options": {"color": "red", "marker": "o"},
@@ -489,7 +323,7 @@ def test_temporal_prediction():
         },
     )
     # plot.plot(show=True, save_path="test_prediction.mp4")
-    plot.plot(show=True)
+    plot.plot(show=SHOW)
 
 
 def test_spatial_prediction():
@@ -509,23 +343,19 @@ def test_spatial_prediction():
         show_unit=True,
         curves={
             "yaw": {
-                "data": np.array(
+                "data": np.stack(
                     [
-                        np.linspace(0, 10 * np.pi, 1000).reshape(100, 10),
-                        np.sin(np.linspace(0, 10 * np.pi, 1000).reshape(100, 10)),
-                    ]
-                ).transpose(1, 2, 0),
+                        _LIN_10PI_1000.reshape(100, 10),
+                        _SIN_10PI_1000.reshape(100, 10),
+                    ],
+                    axis=-1,
+                ),
                 "curve_type": CurveType.PREDICTION,
                 "curve_style": CurvePlotStyle.PLOT,
                 "options": {"color": "blue", "marker": "o"},
             },
             "yaw2": {
-                "data": np.array(
-                    [
-                        np.linspace(0, 10 * np.pi, 1000),
-                        np.cos(np.linspace(0, 10 * np.pi, 1000)),
-                    ]
-                ).T,
+                "data": np.stack([_LIN_10PI_1000, _COS_10PI_1000], axis=-1),
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.PLOT,
                 "options": {"color": "red", "marker": "o"},
@@ -533,7 +363,7 @@ def test_spatial_prediction():
         },
     )
     # plot.plot(show=True, save_path="test_prediction.mp4")
-    plot.plot(show=True)
+    plot.plot(show=SHOW)
 
 
 def test_car():
@@ -554,24 +384,12 @@ def test_car():
         show_unit=True,
         curves={
             "yaw": {
-                "data": 10
-                * np.array(
-                    [
-                        np.linspace(0, 10 * np.pi, 100),
-                        np.cos(np.linspace(0, 10 * np.pi, 100)),
-                    ]
-                ).T,
+                "data": 10 * np.stack([_LIN_10PI_100, _COS_10PI_100], axis=-1),
                 "curve_type": CurveType.REGULAR,
                 "curve_style": CurvePlotStyle.PLOT,
             },
             "yaw2": {
-                "data": 10
-                * np.array(
-                    [
-                        np.linspace(0, 10 * np.pi, 100),
-                        np.sin(np.linspace(0, 10 * np.pi, 100)),
-                    ]
-                ).T,
+                "data": 10 * np.stack([_LIN_10PI_100, _SIN_10PI_100], axis=-1),
                 "curve_type": CurveType.REGULAR,
                 "curve_style": CurvePlotStyle.PLOT,
             },
@@ -581,12 +399,14 @@ def test_car():
         car_ids=[1, 2],
     )
     plot.plot(
-        show=True,
-        save_path=os.path.join(os.path.dirname(__file__), "test_car.mp4"),
+        show=SHOW,
+        save_path=(
+            os.path.join(os.path.dirname(__file__), "test_car.mp4") if SAVE else None
+        ),
     )
 
 
-def test_prediction_curves_ignored_in_static_mode():
+def test_prediction_curves_ignored_in_static_mode(rng: np.random.Generator):
     plot = Plot(
         mode=PlotMode.STATIC,
         col_nbr=2,
@@ -599,12 +419,11 @@ def test_prediction_curves_ignored_in_static_mode():
     M = 10  # number of prediction steps
 
     # create data for the map subplot
-    x = np.linspace(0, 2 * np.pi, N + M)
-    y = np.sin(x) + np.random.randn(N + M) * 0.1
-    predictions = np.zeros((N, M, 2))
-    for i in range(N):
-        predictions[i, :, 0] = x[i : i + M]
-        predictions[i, :, 1] = y[i : i + M]
+    x = np.linspace(0, 2 * np.pi, N + M, dtype=np.float32)
+    y = np.sin(x) + rng.standard_normal(N + M, dtype=np.float32) * 0.1
+    predictions = np.stack(
+        [sliding_window_view(x, M)[:N], sliding_window_view(y, M)[:N]], axis=-1
+    )
     trajectory = np.array([x[:N], y[:N]]).T
 
     plot.add_subplot(
@@ -616,7 +435,7 @@ def test_prediction_curves_ignored_in_static_mode():
         show_unit=True,
         curves={
             "cones": {
-                "data": np.random.rand(10, 2) * np.pi,
+                "data": rng.random((10, 2), dtype=np.float32) * np.pi,
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.SCATTER,
                 "mpl_options": {"color": "red", "marker": "^"},
@@ -636,10 +455,8 @@ def test_prediction_curves_ignored_in_static_mode():
         },
     )
     # create data for the speed and steering angle subplots
-    y = np.random.rand(N + M) * 10
-    predictions = np.zeros((N, M))
-    for i in range(N):
-        predictions[i, :] = y[i : i + M]
+    y = rng.random(N + M, dtype=np.float32) * 10.0
+    predictions = sliding_window_view(y, M)[:N].copy()
     trajectory = y[:N]
 
     plot.add_subplot(
@@ -693,14 +510,63 @@ def test_prediction_curves_ignored_in_static_mode():
     ), "Prediction curves should be empty in static mode"
 
 
+def test_append_live_data():
+    # the values are promoted like with np.append
+    data = _append_live_data(None, np.array([0, 0]))
+    data = _append_live_data(data, np.array([1.0, 2.5]))
+    np.testing.assert_array_equal(data, [[0.0, 0.0], [1.0, 2.5]])
+    # data that was not allocated by _append_live_data is copied, not written into
+    initial = np.zeros((4, 2))
+    data = _append_live_data(initial[:3], np.ones(2))
+    np.testing.assert_array_equal(initial, np.zeros((4, 2)))
+    np.testing.assert_array_equal(data, [[0, 0], [0, 0], [0, 0], [1, 1]])
+    # the previous views are not modified by the next appends
+    previous = data
+    for i in range(2000):
+        data = _append_live_data(data, np.full(2, i))
+    assert previous.shape == (4, 2) and data.shape == (2004, 2)
+    np.testing.assert_array_equal(data[-1], [1999, 1999])
+
+
+def test_grow_live_limits_linear_scale():
+    # the first limits get a margin of 25% of the data span on each side, and the
+    # limits only grow when the data goes out of them
+    fig, ax = plt.subplots()
+    (line,) = ax.plot(np.arange(5), np.full(5, 3.0))
+    subplot = {"ax": ax, "limits": None}
+    subplot["limits"] = _grow_live_limits(subplot)
+    np.testing.assert_allclose(subplot["limits"][0], (-1.0, 5.0))
+    # a constant curve has no span, the margin is then 1
+    np.testing.assert_allclose(subplot["limits"][1], (2.0, 4.0))
+    line.set_data(np.arange(6), np.full(6, 3.0))
+    assert _grow_live_limits(subplot) == subplot["limits"]
+    assert ax.get_xlim() == subplot["limits"][0]
+
+
+def test_grow_live_limits_log_scale():
+    # the margin of the live limits is applied to the logarithms on a log scale, so that
+    # they stay positive
+    fig, ax = plt.subplots()
+    (line,) = ax.semilogy(np.arange(5), np.logspace(0, 2, 5))
+    subplot = {"ax": ax, "limits": None}
+    subplot["limits"] = _grow_live_limits(subplot)
+    np.testing.assert_allclose(subplot["limits"][1], (10**-0.5, 10**2.5))
+    line.set_data(np.arange(5), np.logspace(-1, 2, 5))
+    subplot["limits"] = _grow_live_limits(subplot)
+    assert subplot["limits"][1][0] > 0.0
+    assert ax.get_ylim() == subplot["limits"][1]
+
+
 @pytest.mark.skip("to be used for visual tests")
-def test_all():
+def test_all(static_pts: np.ndarray, digit127_path: np.ndarray):
     """
     you should see a 2d plot :
         - randomly distributed red triangles
         - randomly distributed blue circles with a line connecting them
     """
-    test_spatial_plot_scatter(PlotMode.STATIC, "STATIC")
+    test_spatial_plot(
+        PlotMode.STATIC, CurvePlotStyle.SCATTER, static_pts, digit127_path
+    )
 
     """
     you should see a 2d plot :
@@ -708,53 +574,55 @@ def test_all():
         - 127 written with DYNAMIC blue circles with a line connecting them
     [NOTE] Dynamic scatter is not implemented yet
     """
-    test_spatial_plot_scatter(PlotMode.DYNAMIC, "DYNAMIC")
+    test_spatial_plot(
+        PlotMode.DYNAMIC, CurvePlotStyle.SCATTER, static_pts, digit127_path
+    )
 
     """
     you should see a 2d plot :
         - randomly distributed red triangles with a line connecting them
         - 127 written with lines
     """
-    test_spatial_plot_plot(PlotMode.STATIC, "STATIC")
+    test_spatial_plot(PlotMode.STATIC, CurvePlotStyle.PLOT, static_pts, digit127_path)
 
     """
     you should see a 2d plot :
         - randomly distributed STATIC red triangles with a line connecting them
         - 127 written with DYNAMIC lines
     """
-    test_spatial_plot_plot(PlotMode.DYNAMIC, "DYNAMIC")
+    test_spatial_plot(PlotMode.DYNAMIC, CurvePlotStyle.PLOT, static_pts, digit127_path)
 
     """
     you should see a 2d plot :
         - randomly distributed red triangles with a only vertical or horizontal lines connecting them
         - randomly distributed vecrtical and horizontal lines
     """
-    test_spatial_plot_step(PlotMode.STATIC, "STATIC")
+    test_spatial_plot(PlotMode.STATIC, CurvePlotStyle.STEP, static_pts, digit127_path)
 
     """
     you should see a 2d plot :
         - randomly distributed STATIC red triangles with a only vertical or horizontal lines connecting them
         - randomly distributed DYNAMIC vertical and horizontal lines
     """
-    test_spatial_plot_step(PlotMode.DYNAMIC, "DYNAMIC")
+    test_spatial_plot(PlotMode.DYNAMIC, CurvePlotStyle.STEP, static_pts, digit127_path)
 
     """
     you should see a 2d plot :
         - an exponential curve with x axis in log scale
     """
-    test_temporal_plot_semilogx(PlotMode.STATIC, "STATIC")
+    test_temporal_plot(PlotMode.STATIC, CurvePlotStyle.SEMILOGX)
 
     """
     you should see a 2d plot :
         - an exponential curve with y axis in log scale
     """
-    test_temporal_plot_semilogy(PlotMode.STATIC, "STATIC")
+    test_temporal_plot(PlotMode.STATIC, CurvePlotStyle.SEMILOGY)
 
     """
     you should see a 2d plot :
         - an exponential curve with x and y axis in log scale
     """
-    test_temporal_plot_loglog(PlotMode.STATIC, "STATIC")
+    test_temporal_plot(PlotMode.STATIC, CurvePlotStyle.LOGLOG)
 
     """
     you should see a dynamic 2d plot :
@@ -0,0 +1,118 @@
+#  Copyright (c) 2022. Tudor Oancea, EPFL Racing Team Driverless
+import pickle
+import queue
+import socket
+import time
+from threading import Thread
+
+import numpy as np
+import pytest
+
+from data_visualization import Publisher, STOP_SIGNAL
+from data_visualization.constants import DEFAULT_HOST
+from data_visualization.subscriber import MsgDecoder, launch_client
+
+
+@pytest.fixture
+def publisher():
+    # the OS chooses a free port
+    publisher = Publisher(port=0)
+    yield publisher
+    publisher.terminate()
+
+
+def _receive(publisher: Publisher, msg_nbr: int) -> list:
+    # connects a Subscriber to the Publisher in a thread, and returns the first msg_nbr
+    # messages it receives, decoded like in a Plot
+    q = queue.Queue()
+    port = publisher._publisher_socket.getsockname()[1]
+    Thread(target=launch_client, args=(q, DEFAULT_HOST, port), daemon=True).start()
+    decoder = MsgDecoder()
+    msgs = []
+    while len(msgs) < msg_nbr:
+        msg = decoder.decode(q.get(timeout=20))
+        if msg is not None:
+            msgs.append(msg)
+    return msgs
+
+
+def test_dict_msg(publisher: Publisher):
+    trajectory = np.arange(10.0).reshape(5, 2)
+    publisher.publish_msg(
+        {
+            "map": {
+                "trajectory": trajectory,
+                "trajectory_pred": trajectory,
+                "cones": None,
+            }
+        }
+    )
+    (msg,) = _receive(publisher, 1)
+    # the float64 arrays are sent in float32, and only once if they are shared
+    np.testing.assert_array_equal(msg["map"]["trajectory"], trajectory)
+    assert msg["map"]["trajectory"].dtype == np.float32
+    assert msg["map"]["trajectory_pred"] is msg["map"]["trajectory"]
+    assert msg["map"]["cones"] is None
+
+
+def test_schema_msg(publisher: Publisher):
+    token = publisher.register_schema(
+        {
+            "map": {"trajectory": np.zeros(2), "cones": None},
+            "speed": {"speed": np.float64(0.0), "speed_pred": np.zeros(10)},
+        }
+    )
+    publisher.publish_msg(token, [np.array([1.0, 2.0]), 3.0, np.arange(10.0)])
+    publisher.publish_msg(token, [np.array([4.0, 5.0]), 6.0, np.zeros(10)])
+    publisher.publish_msg(STOP_SIGNAL)
+    first, second, stop = _receive(publisher, 3)
+    assert first["map"]["cones"] is None
+    np.testing.assert_array_equal(first["map"]["trajectory"], [1.0, 2.0])
+    assert first["speed"]["speed"] == 3.0
+    np.testing.assert_array_equal(first["speed"]["speed_pred"], np.arange(10.0))
+    np.testing.assert_array_equal(second["map"]["trajectory"], [4.0, 5.0])
+    assert second["speed"]["speed"] == 6.0
+    assert stop == STOP_SIGNAL
+
+
+def test_schema_msg_errors(publisher: Publisher):
+    token = publisher.register_schema({"map": {"trajectory": np.zeros(2)}})
+    with pytest.raises(ValueError, match="should have shape"):
+        publisher.publish_msg(token, [np.zeros(3)])
+    with pytest.raises(ValueError, match="Expected 1 values"):
+        publisher.publish_msg(token, [np.zeros(2), np.zeros(2)])
+    with pytest.raises(ValueError, match="Unknown schema token"):
+        publisher.publish_msg(token + 1, [np.zeros(2)])
+
+
+def test_unknown_schema_decoding():
+    # values of a schema that the decoder did not receive
+    frame = (pickle.dumps((0, pickle.PickleBuffer(bytes(16))), protocol=5), [])
+    with pytest.raises(pickle.UnpicklingError, match="Unknown schema"):
+        MsgDecoder().decode(frame)
+
+
+def test_publish_after_terminate(publisher: Publisher):
+    # the messages published once the event loop is closed are dropped
+    publisher.terminate()
+    publisher.publish_msg({"map": {"trajectory": np.zeros(2)}})
+    publisher.register_schema({"map": {"trajectory": np.zeros(2)}})
+
+
+def test_terminate_stalled_subscriber(publisher: Publisher, monkeypatch):
+    # terminate() drops the messages that a Subscriber which stopped reading did not
+    # receive, instead of waiting for it forever
+    monkeypatch.setattr("data_visualization.publisher._TERMINATE_TIMEOUT", 0.5)
+    port = publisher._publisher_socket.getsockname()[1]
+    with socket.create_connection((DEFAULT_HOST, port)):
+        for _ in range(20):
+            publisher.publish_msg({"map": {"trajectory": np.zeros((1 << 20, 2))}})
+        # wait until the Publisher starts sending them
+        deadline = time.monotonic() + 20
+        while publisher.msgs_sent == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert publisher.msgs_sent > 0
+        start = time.monotonic()
+        publisher.terminate()
+        assert 0.5 <= time.monotonic() - start < 5
+        assert not publisher._publisher_thread.is_alive()
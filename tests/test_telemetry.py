@@ -6,6 +6,8 @@ from track_database import skidpad, acceleration_track
 from data_visualization.plot import *
 import data_visualization
 
+rng = np.random.default_rng(0)
+
 
 def main():
     if not len(sys.argv) > 1:
@@ -29,21 +31,22 @@ def test_plot_telemetry(track="skidpad", show_units=False):
         skidpad(0.5) if track == "skidpad" else acceleration_track(0.5)
     )
 
+    # noise of the 6 temporal signals, drawn at once
+    noise = rng.normal(0, 0.1, (6, 100))
+    sin = np.sin(2 * np.linspace(0, 2 * np.pi, 100))
+    # speed ramping up to 10 and then constant
+    speed = np.full(100, 10.0)
+    speed[:30] = np.linspace(0, 10, 30)
+
     data_visualization.plot.plot_telemetry(
         track,
-        trajectory=center_line + np.random.normal(0, 0.1, center_line.shape),
-        steering=20 * np.sin(2 * np.linspace(0, 2 * np.pi, 100))
-        + 60
-        + np.random.normal(0, 0.1, 100),
-        motor=np.repeat(1400, 100) + np.random.normal(0, 0.1, 100),
-        yaw=4 * np.sin(2 * np.linspace(0, 2 * np.pi, 100))
-        + np.random.normal(0, 0.1, 100),
-        yaw_rate=4 * np.sin(2 * np.linspace(0, 2 * np.pi, 100))
-        + np.random.normal(0, 0.1, 100),
-        vx=np.concatenate((np.linspace(0, 10, 30), np.repeat(10, 70)))
-        + np.random.normal(0, 0.1, 100),
-        vy=np.concatenate((np.linspace(0, 10, 30), np.repeat(10, 70)))
-        + np.random.normal(0, 0.1, 100),
+        trajectory=center_line + rng.normal(0, 0.1, center_line.shape),
+        steering=20 * sin + 60 + noise[0],
+        motor=1400 + noise[1],
+        yaw=4 * sin + noise[2],
+        yaw_rate=4 * sin + noise[3],
+        vx=speed + noise[4],
+        vy=speed + noise[5],
         show_units=show_units,
     )
 
@@ -65,7 +68,7 @@ def test_plot():
         subplot_type=SubplotType.SPATIAL,
         curves={
             "left_cones": {
-                "data": np.random.rand(4, 2) * 10.0,
+                "data": rng.random((4, 2)) * 10.0,
                 "curve_type": CurveType.STATIC,
                 "curve_style": CurvePlotStyle.SCATTER,
                 "mpl_options": {"color": "red", "marker": "^"},
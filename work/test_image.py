@@ -1,13 +1,5 @@
 from fsds_client import Simulation
 import cv2
-from time import perf_counter
-
-
-def sleep(seconds):
-    start = perf_counter()
-    while perf_counter() - start < seconds:
-        pass
-
 
 if __name__ == "__main__":
     # initialize simulation
@@ -19,7 +11,8 @@ if __name__ == "__main__":
         image = sim.get_image()
         # show image
         cv2.imshow("image", image)
-        # wait for key
-        cv2.waitKey(1)
-        # sleep
-        sleep(0.1)
+        # wait 100 ms for a key, which also handles the window events meanwhile, and
+        # stop on Esc
+        if cv2.waitKey(100) == 27:
+            break
+    cv2.destroyAllWindows()
@@ -2,9 +2,22 @@
 import pyqtgraph as pg
 import numpy as np
 
-x = np.linspace(0.0, 2 * np.pi, 1000)
+x = np.linspace(0.0, 2 * np.pi, 1000, dtype=np.float32)
 y = np.sin(x)
-pw = pg.plot(x, y, pen="r")  # plot x vs y in red
+pw = pg.plot()
+# plot x vs y in red, drawing at most about one segment per pixel of the visible
+# part of the curve
+pw.addItem(
+    pg.PlotDataItem(
+        x,
+        y,
+        pen=pg.mkPen("r", width=1, cosmetic=True),
+        antialias=False,
+        autoDownsample=True,
+        downsampleMethod="peak",
+        clipToView=True,
+    )
+)
 y2 = np.cos(x)
 y3 = np.tan(x)
 # pw.plot(x, y2, pen="b")